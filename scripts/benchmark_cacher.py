@@ -0,0 +1,112 @@
+import argparse
+import os
+import pathlib
+import random
+import string
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diskcache as dc  # type: ignore
+
+from src.cacher import Cacher, match_complex_case
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark cache lookups and case matching over a synthetic corpus.")
+    parser.add_argument("--words", type=int, default=100_000, help="Number of words in the corpus.")
+    parser.add_argument("--vocabulary", type=int, default=5_000, help="Number of distinct words in the cache.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the corpus.")
+    return parser.parse_args()
+
+
+def make_word(rnd: random.Random) -> str:
+    return "".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 12)))
+
+
+def make_corpus(rnd: random.Random, vocabulary: list[str], words: int) -> list[str]:
+    """Mostly known words in the casing seen in UI strings, plus some words that are not in the cache."""
+    corpus = []
+    for _ in range(words):
+        word = rnd.choice(vocabulary) if rnd.random() < 0.8 else make_word(rnd)
+        casing = rnd.random()
+        if casing < 0.3:
+            word = word.capitalize()
+        elif casing < 0.4:
+            word = word.upper()
+        corpus.append(word)
+    return corpus
+
+
+def legacy_match_complex_case(reference_str: str, target_str: str | None) -> str | None:
+    """Per-character case matching, as used before the case patterns."""
+    if not reference_str or not target_str:
+        return None
+
+    def match_char_case(ref_char: str, target_char: str) -> str:
+        if ref_char.isupper():
+            return target_char.upper()
+        else:
+            return target_char.lower()
+
+    if len(reference_str) < len(target_str):
+        reference_str += reference_str[-1] * (len(target_str) - len(reference_str))
+    return "".join(match_char_case(ref_char, target_char) for ref_char, target_char in zip(reference_str, target_str))
+
+
+def legacy_cache_get_string(cache: dc.Cache, key: str) -> str | None:
+    """Lookup of up to three key variants, as used before the lowercased keys."""
+    value = cache.get(key)
+    if value is None and key != key.capitalize():
+        value = legacy_match_complex_case(key, cache.get(key.capitalize()))
+    if value is None and key != key.lower():
+        value = legacy_match_complex_case(key, cache.get(key.lower()))
+    return value
+
+
+def run(name: str, corpus: list[str], func: Callable[[str], str | None]) -> None:
+    start = time.perf_counter()
+    hits = sum(1 for word in corpus if func(word) is not None)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(corpus) / elapsed:>12,.0f} words/s  ({hits} hits, {elapsed:.3f}s)")
+
+
+def main() -> None:
+    args = parse_args()
+    rnd = random.Random(args.seed)
+    vocabulary = sorted({make_word(rnd) for _ in range(args.vocabulary)})
+    translations = {word: word[::-1] + "ić" for word in vocabulary}
+    corpus = make_corpus(rnd, vocabulary, args.words)
+    print(f"Corpus: {len(corpus)} words, {len(vocabulary)} cached entries")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cacher = Cacher(lang="benchmark", cache_root=pathlib.Path(tmp_dir))
+        legacy_cache = dc.Cache(os.path.join(tmp_dir, "legacy"))
+        for word, translation in translations.items():
+            cacher.cache_update_string(word, translation)
+            legacy_cache[word] = translation
+
+        run("legacy cache_get_string", corpus, lambda word: legacy_cache_get_string(legacy_cache, word))
+        run("cache_get_string", corpus, cacher.cache_get_string)
+
+        targets = [translations.get(word.lower(), word) for word in corpus]
+        pairs = list(zip(corpus, targets))
+        for name, func in (
+            ("legacy match_complex_case", legacy_match_complex_case),
+            ("match_complex_case", match_complex_case),
+        ):
+            start = time.perf_counter()
+            for reference_str, target_str in pairs:
+                func(reference_str, target_str)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<28} {len(pairs) / elapsed:>12,.0f} words/s  ({elapsed:.3f}s)")
+
+        cacher.cache.close()
+        legacy_cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 import argparse
 import os
 import sys
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.batch_controller import AdaptiveBatchSize
 from src.cacher import Cacher
 from src.gpt_translator import GPTTranslator
+from src.review_queue import ReviewQueue
 from src.translation_processor import TranslationProcessor
 from src.utils import load_config
 
@@ -26,7 +29,51 @@ def parse_args() -> argparse.Namespace:
         default=False,
         help="Answer yes to all prompts.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="Number of Weblate pages to fetch in the background while translating, 0 to disable.",
+    )
+    parser.add_argument(
+        "--review-queue",
+        action="store_true",
+        default=False,
+        help="Put translations in a persistent review queue instead of asking for each one, see --review.",
+    )
+    parser.add_argument(
+        "--review-queue-size",
+        type=int,
+        default=200,
+        help="Maximum number of translations waiting in the review queue before the translation pauses.",
+    )
+    parser.add_argument(
+        "--review",
+        action="store_true",
+        default=False,
+        help="Review the translations from the review queue and commit the approved ones, instead of translating.",
+    )
+    args = parser.parse_args()
+    if args.review and args.yes:
+        parser.error("--yes cannot be used with --review, the review asks for each translation")
+    return args
+
+
+def review(processors: list[TranslationProcessor]) -> None:
+    """Work through the review queues, waiting for new translations when all of them are empty."""
+    waiting = False
+    try:
+        while True:
+            reviewed = sum(processor.review_queued_translations() for processor in processors)
+            if reviewed:
+                waiting = False
+            elif not waiting:
+                print("Review queue is empty, waiting for new translations (Ctrl-C to stop)...")
+                waiting = True
+            time.sleep(0 if reviewed else 10)
+    except KeyboardInterrupt:
+        print()
+        print("Review stopped.")
 
 
 def main() -> None:
@@ -47,23 +94,43 @@ def main() -> None:
     gpt_api_key = gpt_provider.get("api_key")
     gpt_reliable = gpt_provider.get("reliable", False)
 
+    if args.review_queue and args.yes:
+        print("Ignoring --review-queue since all translations are auto approved with --yes")
+    use_review_queue = args.review or (args.review_queue and not args.yes)
+
+    processors = []
     for weblate in config["weblate"]:
         print(f"Processing {weblate['name']}...")
         target_lang = weblate["target_language"]
         cacher = Cacher(lang=target_lang)
-        gpt_translator = GPTTranslator(
-            prompt=config["gpt"]["prompt"],
-            prompt_extension_flags_max_length=config["gpt"].get("prompt_extension_flags_max_length"),
-            prompt_glossary=config["gpt"].get("prompt_glossary"),
-            prompt_plural=config["gpt"].get("prompt_plural"),
-            prompt_remind_translate=config["gpt"].get("prompt_remind_translate"),
-            target_lang=target_lang,
-            cacher=cacher,
-            provider_name=gpt_provider_name,
-            model=gpt_model,
-            api_key=gpt_api_key,
-            reliable=gpt_reliable,
-        )
+        batch_controller = None
+        gpt_translator = None
+        # Reviewing only commits queued translations, it needs neither the LLM nor the batch size
+        if not args.review:
+            batch_controller = AdaptiveBatchSize(
+                state_path=cacher.cache_dir() / "batch_sizes.json",
+                key=f"{gpt_provider_name}/{gpt_model}",
+                min_size=gpt_provider.get("batch_size_min", 5),
+                max_size=gpt_provider.get("batch_size_max", 200),
+                target_latency=gpt_provider.get("target_latency", 120.0),
+            )
+            gpt_translator = GPTTranslator(
+                prompt=config["gpt"]["prompt"],
+                prompt_extension_flags_max_length=config["gpt"].get("prompt_extension_flags_max_length"),
+                prompt_glossary=config["gpt"].get("prompt_glossary"),
+                glossary_prefix_max_chars=config["gpt"].get("glossary_prefix_max_chars"),
+                prompt_plural=config["gpt"].get("prompt_plural"),
+                prompt_remind_translate=config["gpt"].get("prompt_remind_translate"),
+                target_lang=target_lang,
+                cacher=cacher,
+                provider_name=gpt_provider_name,
+                model=gpt_model,
+                api_key=gpt_api_key,
+                reliable=gpt_reliable,
+            )
+        review_queue = None
+        if use_review_queue:
+            review_queue = ReviewQueue(cacher.cache_dir() / weblate["name"] / "review_queue", args.review_queue_size)
         processor = TranslationProcessor(
             weblate_name=weblate["name"],
             username=weblate["username"],
@@ -75,11 +142,21 @@ def main() -> None:
             cacher=cacher,
             gpt_reliable=gpt_reliable,
             answer_yes=args.yes,
+            batch_controller=batch_controller,
+            prefetch_pages=args.prefetch,
+            review_queue=review_queue,
         )
+        if args.review:
+            processors.append(processor)
+            continue
 
         print("Processing incomplete translations...")
         processor.process_incomplete_translations()
 
+    if args.review:
+        review(processors)
+        return
+
     print("Translation process completed.")
 
 
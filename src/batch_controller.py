@@ -0,0 +1,91 @@
+import datetime
+import json
+import pathlib
+
+
+class AdaptiveBatchSize:
+    """
+    AIMD controller for the number of units sent to the LLM in one request.
+
+    The batch grows by a fixed step after every full batch whose translation request was fast and parsed well, and is
+    cut by a factor as soon as a batch is slow, needs retries or loses translations. The learned size is kept per
+    provider and model in a JSON file, so the next run starts from where the previous one stopped.
+    """
+
+    def __init__(
+        self,
+        state_path: pathlib.Path,
+        key: str,
+        initial: int = 50,
+        min_size: int = 5,
+        max_size: int = 200,
+        increase: int = 5,
+        decrease_factor: float = 0.5,
+        target_latency: float = 120.0,
+        min_success_rate: float = 0.9,
+    ) -> None:
+        self.state_path = state_path
+        self.key = key
+        self.min_size = min_size
+        self.max_size = max_size
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.min_success_rate = min_success_rate
+        self._batch_size = self._clamp(self._load_state().get(key, {}).get("batch_size", initial))
+        print(f"Batch size for {key}: {self._batch_size}")
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
+
+    def record(self, units: int, translated: int, latency: float, attempts: int, full: bool) -> None:
+        """
+        Record the outcome of one request and adjust the batch size.
+
+        `full` tells whether the batch was limited by the batch size (or used all the units that were available),
+        only such batches can grow the batch size. `latency` is the time of the translation request alone.
+        """
+        success_rate = translated / units if units else 1.0
+        if latency > self.target_latency or success_rate < self.min_success_rate or attempts > 1:
+            print(
+                f"Batch of {units} units degraded (latency {latency:.1f}s, {success_rate:.0%} parsed, "
+                f"{attempts} attempts)"
+            )
+            self._set_batch_size(int(self._batch_size * self.decrease_factor))
+        elif full:
+            self._set_batch_size(self._batch_size + self.increase)
+
+    def record_failure(self) -> None:
+        """Record a request that failed completely."""
+        print(f"Batch failed for {self.key}")
+        self._set_batch_size(int(self._batch_size * self.decrease_factor))
+
+    def _set_batch_size(self, size: int) -> None:
+        size = self._clamp(size)
+        if size != self._batch_size:
+            print(f"Changing batch size for {self.key}: {self._batch_size} --> {size}")
+            self._batch_size = size
+        self._save_state()
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except ValueError:
+            print("Failed to parse batch size state, starting over:", self.state_path)
+            return {}
+
+    def _save_state(self) -> None:
+        state = self._load_state()
+        state[self.key] = {"batch_size": self._batch_size, "updated": datetime.datetime.now().isoformat()}
+        self.state_path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, indent=2, sort_keys=True)
+        tmp_path.replace(self.state_path)
@@ -1,12 +1,23 @@
 import pathlib
+import re
 
 import diskcache as dc  # type: ignore
 
+# Bump when the layout of the cache entries changes, entries written with older layouts are migrated on open
+CACHE_SCHEMA_VERSION = 2
+_SCHEMA_KEY = ("__schema__",)
+
+# Case patterns, see encode_case()
+CASE_LOWER = "l"
+CASE_UPPER = "U"
+CASE_CAPITALIZED = "Ul"
+
 
 class Cacher:
-    def __init__(self, lang: str) -> None:
-        self._cache_dir = pathlib.Path(__file__).parent.parent / "cache" / lang
+    def __init__(self, lang: str, cache_root: pathlib.Path | None = None) -> None:
+        self._cache_dir = (cache_root or pathlib.Path(__file__).parent.parent / "cache") / lang
         self.cache = dc.Cache(self._cache_dir)
+        self._migrate()
 
     def cache_dir(self) -> pathlib.Path:
         return self._cache_dir
@@ -28,39 +39,122 @@ class Cacher:
             self.cache_update_string(s, t)
 
     def cache_get_string(self, key: str) -> str | None:
-        value = self.cache.get(key)
-        if value is None and key != key.capitalize():
-            value = match_complex_case(key, self.cache.get(key.capitalize()))
-        if value is None and key != key.lower():
-            value = match_complex_case(key, self.cache.get(key.lower()))
-        if value is None:
+        """
+        Look up a translation with a single cache read.
+
+        All casings of a source string are stored together under the lowercased key, as {source: translation}. An
+        exact match is returned as stored, otherwise the capitalized and then the lowercase source get the casing of
+        the key applied to their translation.
+        """
+        if not key:
+            return None
+        variants = _as_variants(key.lower(), self.cache.get(key.lower()))
+        value = variants.get(key)
+        if value is not None:
+            # print("Found cache %s --> %s" % (key, value))
+            return value
+        base_value = variants.get(key.capitalize()) if key != key.capitalize() else None
+        if not base_value and key != key.lower():
+            base_value = variants.get(key.lower())
+        if not base_value:
             return None
-        # print("Found cache %s --> %s" % (key, value))
-        return value
+        return apply_case(encode_case(key), base_value)
 
     def cache_update_string(self, key: str, value: str) -> None:
         # print("Updating cache %s --> %s" % (key, value))
-        self.cache[key] = value
+        with self.cache.transact():
+            variants = _as_variants(key.lower(), self.cache.get(key.lower()))
+            variants[key] = value
+            self.cache[key.lower()] = variants
 
     def cache_clear(self) -> None:
         self.cache.clear()
+        self.cache[_SCHEMA_KEY] = CACHE_SCHEMA_VERSION
 
+    def _migrate(self) -> None:
+        """Group the entries of the original layout by lowercased key, keeping every casing of every source string."""
+        if self.cache.get(_SCHEMA_KEY) == CACHE_SCHEMA_VERSION:
+            return
+        # Original layout: the raw source string as the key and the translation as the value
+        old_keys = [key for key in self.cache if isinstance(key, str) and isinstance(self.cache.get(key), str)]
+        if old_keys:
+            print(f"Migrating {len(old_keys)} cache entries in {self._cache_dir}")
+        migrated: dict[str, dict[str, str]] = {}
+        for key in old_keys:
+            migrated.setdefault(key.lower(), {})[key] = self.cache.get(key)
+        with self.cache.transact():
+            for key in old_keys:
+                if key not in migrated:
+                    del self.cache[key]
+            for canonical_key, variants in migrated.items():
+                self.cache[canonical_key] = variants
+            self.cache[_SCHEMA_KEY] = CACHE_SCHEMA_VERSION
 
-def match_complex_case(reference_str: str, target_str: str) -> str | None:
-    if not reference_str or not target_str:
-        return None
 
-    def match_char_case(ref_char: str, target_char: str) -> str:
-        if ref_char.isupper():
-            return target_char.upper()
-        else:
-            return target_char.lower()
+def _as_variants(key: str, entry: object) -> dict[str, str]:
+    """Return a cache entry as {source: translation}, also if it is still a plain translation."""
+    if isinstance(entry, dict):
+        return entry
+    if isinstance(entry, str):
+        return {key: entry}
+    return {}
+
+
+class _CaseTable(dict):
+    """str.translate() table mapping every character to "U" (upper) or "l" (anything else), filled on first use."""
+
+    def __missing__(self, codepoint: int) -> str:
+        flag = "U" if chr(codepoint).isupper() else "l"
+        self[codepoint] = flag
+        return flag
 
-    if len(reference_str) < len(target_str):
-        # target string is longer than the source string
-        # ==> repeat the last char of the source string to match the length of the target string
-        reference_str += reference_str[-1] * (len(target_str) - len(reference_str))
-    # Iterate over both strings and apply case based on the reference string
-    result = "".join(match_char_case(ref_char, target_char) for ref_char, target_char in zip(reference_str, target_str))
 
-    return result
+_CASE_TABLE = _CaseTable()
+_CASE_RUN_RE = re.compile(r"U+|l+")
+
+
+def encode_case(reference_str: str) -> str:
+    """
+    Encode the casing of a string as a compact pattern.
+
+    Uppercase characters are encoded as "U" and anything else as "l", with a single str.translate(). The common cases
+    are shortened to a single token: CASE_LOWER, CASE_UPPER or CASE_CAPITALIZED.
+    """
+    case_pattern = reference_str.translate(_CASE_TABLE)
+    if "U" not in case_pattern:
+        return CASE_LOWER
+    if "l" not in case_pattern:
+        return CASE_UPPER
+    if case_pattern[0] == "U" and "U" not in case_pattern[1:]:
+        return CASE_CAPITALIZED
+    return case_pattern
+
+
+def apply_case(case_pattern: str, target_str: str) -> str:
+    """
+    Apply a pattern from encode_case() to the target string.
+
+    The common patterns are a single string operation. Other patterns are applied run by run of the same case, and
+    if the target is longer than the pattern the last character of the pattern is repeated. Unlike a conversion
+    character by character, this applies context-dependent mappings such as the Greek final sigma.
+    """
+    if case_pattern == CASE_LOWER:
+        return target_str.lower()
+    if case_pattern == CASE_UPPER:
+        return target_str.upper()
+    if case_pattern == CASE_CAPITALIZED:
+        return target_str[:1].upper() + target_str[1:].lower()
+    if len(case_pattern) < len(target_str):
+        case_pattern += case_pattern[-1] * (len(target_str) - len(case_pattern))
+    result = []
+    for run in _CASE_RUN_RE.finditer(case_pattern, 0, len(target_str)):
+        chunk = target_str[run.start() : run.end()]
+        result.append(chunk.upper() if run.group()[0] == "U" else chunk.lower())
+    return "".join(result)
+
+
+def match_complex_case(reference_str: str, target_str: str | None) -> str | None:
+    """Return target_str with the casing of reference_str."""
+    if not reference_str or not target_str:
+        return None
+    return apply_case(encode_case(reference_str), target_str)
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
+import hashlib
 import json
 import os.path
 import re
-import sys
 import time
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Any, Optional
 
 import g4f  # type: ignore
 import g4f.debug  # type: ignore
@@ -16,6 +16,8 @@ from .cacher import Cacher
 
 g4f.debug.logging = True
 
+_TERM_STRIP_RE = re.compile(r"\W*(.+?)\W*$", flags=re.UNICODE)
+
 cookies_dir = os.path.join(os.path.dirname(__file__), "har_and_cookies")
 set_cookies_dir(cookies_dir)
 read_cookie_files(cookies_dir)
@@ -26,6 +28,43 @@ class TranslationResponse:
     translation_units: dict[str, dict] = field(default_factory=dict)
     new_glossary: dict[str, str] = field(default_factory=dict)
     is_reliable: bool = False
+    latency: float = 0.0  # Time spent in the translation requests, without the grammar check
+    attempts: int = 1
+
+
+@dataclass
+class TokenUsage:
+    """Token usage reported by the provider, accumulated over all requests."""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, completion: Any) -> None:  # noqa: ANN401
+        self.requests += 1
+        usage = _get_field(completion, "usage")
+        if usage is None:
+            return
+        self.prompt_tokens += _get_field(usage, "prompt_tokens") or 0
+        self.completion_tokens += _get_field(usage, "completion_tokens") or 0
+        # Only some providers (e.g. OpenAI) report how much of the prompt was served from their prefix cache
+        self.cached_tokens += _get_field(_get_field(usage, "prompt_tokens_details"), "cached_tokens") or 0
+
+    def __str__(self) -> str:
+        cached_pct = 100 * self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0
+        return (
+            f"{self.requests} requests, {self.prompt_tokens} prompt tokens "
+            f"({self.cached_tokens} cached, {cached_pct:.0f}%), {self.completion_tokens} completion tokens"
+        )
+
+
+def _get_field(obj: Any, name: str) -> Any:  # noqa: ANN401
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
 
 
 class GPTTranslator:
@@ -43,6 +82,7 @@ class GPTTranslator:
         target_lang: str = "NONE. STOP TRANSLATION - UNSET LANGUAGE!",
         cacher: Optional[Cacher] = None,
         glossary: Optional[dict[str, str]] = None,
+        glossary_prefix_max_chars: Optional[int] = None,
     ) -> None:
         self.provider_name = provider_name
         self.model = model
@@ -57,34 +97,82 @@ class GPTTranslator:
         self.prompt_remind_translate = prompt_remind_translate or "Please fully translate"
         self.prompt_glossary = prompt_glossary or "Glossary"
         self.prompt_plural = prompt_plural
-        self.glossary = glossary or {}
+        if glossary_prefix_max_chars is None:
+            # The whole glossary is sent with every batch, which only pays off when the provider caches the prefix.
+            # OpenAI does (from 1024 prompt tokens on), the g4f providers do not report any caching.
+            glossary_prefix_max_chars = 30000 if provider_name.lower() == "openai" else 0
+        self.glossary_prefix_max_chars = glossary_prefix_max_chars
+        self.glossary: dict[str, str] = {}
+        self.glossary_block = ""
+        self.glossary_version = ""
         self.cacher = cacher or Cacher(lang="unknown")
+        self.usage = TokenUsage()
+        self.set_glossary(glossary or {})
 
     def set_glossary(self, glossary: dict[str, str]) -> None:
-        """Set glossary (dict of word -> translation) for all translations, will be used in the prompt."""
+        """Set glossary (dict of word -> translation) for all translations, will be used in the prompt.
+
+        The glossary is rendered once into a stable block (sorted, deduplicated and tagged with a content hash)
+        that is sent right after the system prompt, so that providers with prompt caching can reuse the whole
+        prefix across batches. Glossaries longer than glossary_prefix_max_chars fall back to per-batch matching.
+        """
         self.glossary = glossary
+        entries = sorted(set(glossary.values()))
+        version = hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()[:8] if entries else ""
+        block = f"{self.prompt_glossary} (version {version}): " + "; ".join(entries) + "\n" if entries else ""
+        if version != self.glossary_version:
+            print(f"Glossary version {version or 'none'} with {len(entries)} entries")
+        if len(block) > self.glossary_prefix_max_chars:
+            if version != self.glossary_version and self.glossary_prefix_max_chars:
+                print(
+                    f"Glossary is {len(block)} chars, more than glossary_prefix_max_chars"
+                    f" ({self.glossary_prefix_max_chars}); only matching entries will be included per batch"
+                )
+            block = ""
+        self.glossary_block = block
+        self.glossary_version = version
 
     def get_glossary_prompt(self, units: list[dict]) -> str:
+        """Per-batch glossary: terms found in the persistent cache, and weblate glossary terms if not in the prefix."""
         used_glossary: dict[str, str] = {}
+        terms: set[str] = set()
         for unit in units:
             unit_source = " ".join(unit["source"]).lower()
-            for term in self.glossary:
-                # Search each weblate glossary item in input text to build relevant glossary items
-                if term in unit_source:
-                    used_glossary[term] = self.glossary[term]
-            for term in unit_source.split():
-                # Split source item text into terms and (inverse) search in persistent cacher glossary
-                # Remove any leading or trailing non-alphanumerics
-                term = re.sub(r"\W*(.+?)\W*$", r"\1", term, flags=re.UNICODE)
-                if term in used_glossary:
-                    continue
-                cached_translation = self.cacher.cache_get_string(term)
-                if cached_translation:
-                    used_glossary[term] = f"{term}: {cached_translation}"
+            if not self.glossary_block:
+                for term in self.glossary:
+                    # Search each weblate glossary item in input text to build relevant glossary items
+                    if term in unit_source:
+                        used_glossary[term] = self.glossary[term]
+            # Split source item text into terms and (inverse) search in persistent cacher glossary
+            # Remove any leading or trailing non-alphanumerics, and look up every distinct term only once
+            terms.update(_TERM_STRIP_RE.sub(r"\1", term) for term in unit_source.split())
+        for term in sorted(terms):
+            if term in used_glossary or (self.glossary_block and term in self.glossary):
+                continue
+            cached_translation = self.cacher.cache_get_string(term)
+            if cached_translation:
+                used_glossary[term] = f"{term}: {cached_translation}"
         if used_glossary:
-            return self.prompt_glossary + ": " + "; ".join(used_glossary.values()) + "\n"
+            return self.prompt_glossary + ": " + "; ".join(sorted(used_glossary.values())) + "\n"
         return ""
 
+    def build_messages(self, units: list[dict]) -> list[dict[str, str]]:
+        """
+        Build the chat messages for a batch of units.
+
+        The system prompt and the glossary block are identical for every batch, so they go first and form a
+        shared prefix; everything that depends on the batch (cached terms and the units) goes last.
+        """
+        messages = [{"role": "system", "content": self.prompt}]
+        if self.glossary_block:
+            messages.append({"role": "system", "content": self.glossary_block})
+        batch_text = "\n\n".join([self._prepare_one(unit) for unit in units])
+        glossary_prompt = self.get_glossary_prompt(units)
+        if glossary_prompt:
+            batch_text = glossary_prompt + "\n\n" + batch_text
+        messages.append({"role": "user", "content": batch_text})
+        return messages
+
     def _prepare_one(self, unit: dict) -> str:
         result = ""
         result += (self.prompt_remind_translate.strip() + " ") or ""
@@ -100,10 +188,8 @@ class GPTTranslator:
         return result
 
     def translate(self, units: list[dict]) -> TranslationResponse:
-        glossary_prompt = self.get_glossary_prompt(units) or ""
-        input_text = (
-            self.prompt + "\n\n" + glossary_prompt + "\n\n" + "\n\n".join([self._prepare_one(unit) for unit in units])
-        )
+        messages = self.build_messages(units)
+        input_text = "\n\n".join(message["content"] for message in messages)
 
         transl_units = {}
         for unit in units:
@@ -114,12 +200,15 @@ class GPTTranslator:
         print("Waiting before submission...")
         time.sleep(5)
         print("Submitting...")
+        latency = 0.0
         for attempt in range(3):
             try:
                 if attempt > 0:
                     print("Retrying...")
 
-                result, raw_response = self.get_translation(input_text)
+                start = time.monotonic()
+                result, raw_response = self.get_translation(messages)
+                latency += time.monotonic() - start
 
                 if result:
                     (result, raw_response) = self.get_grammar_checked(result)
@@ -146,7 +235,8 @@ class GPTTranslator:
                         transl_unit["target"] = [t.strip() for t in translation.split("__EOU")]
                         transl_units[unit_id] = transl_unit
                 if transl_units:
-                    return TranslationResponse(transl_units, new_glossary, self.reliable)
+                    print("Token usage:", self.usage)
+                    return TranslationResponse(transl_units, new_glossary, self.reliable, latency, attempt + 1)
                 else:
                     print(input_text)
                     print(raw_response)
@@ -157,45 +247,49 @@ class GPTTranslator:
 
         raise Exception(f"Could not translate: {input_text}")
 
-    def get_translation(self, text: str) -> tuple[list[str], str]:
-        raw_response = str(gpt_chat_create(self.provider_name, self.model, self.api_key, text) or "")
+    def get_translation(self, messages: list[dict[str, str]]) -> tuple[list[str], str]:
+        raw_response = str(gpt_chat_create(self.provider_name, self.model, self.api_key, messages, self.usage) or "")
         results = re.findall(r"/>>B(.+?)E<</", raw_response, re.DOTALL)
         if not results:
             print("Could not find translations in the response")
-            print(text)
+            print(messages[-1]["content"])
             print(raw_response)
-            sys.exit(1)
-            results, raw_response = [], ""
+            # Raise instead of exiting, so that the batch is retried and the failure is recorded
+            raise Exception("Could not find translations in the response")
         return results, raw_response
 
     def get_grammar_checked(self, results: list[str]) -> tuple[list[str], str]:
-        text = (
-            "Please fix grammar and typos in the following text and change word synonyms if needed to bring sentences "
-            + "in line with the most commonly used modern forms of the language, but do not alter the language, alphabet, "
-            + "whitespaces, newlines, and other special characters:\n\n"
-            + "\n".join([f"\n/>>B\n{r}\nE<</" for r in results])
-        )
-        raw_response = str(gpt_chat_create(self.provider_name, self.model, self.api_key, text) or "")
+        messages = [
+            {
+                "role": "system",
+                "content": "Please fix grammar and typos in the following text and change word synonyms if needed to "
+                + "bring sentences in line with the most commonly used modern forms of the language, but do not alter "
+                + "the language, alphabet, whitespaces, newlines, and other special characters:",
+            },
+            {"role": "user", "content": "\n".join([f"\n/>>B\n{r}\nE<</" for r in results])},
+        ]
+        text = messages[-1]["content"]
+        raw_response = str(gpt_chat_create(self.provider_name, self.model, self.api_key, messages, self.usage) or "")
         results = re.findall(r"/>>B(.+?)E<</", raw_response, re.DOTALL)
         if not results:
             print("Could not find translations in the response")
             print(text)
             print(raw_response)
-            sys.exit(1)
-            results, raw_response = [], ""
+            raise Exception("Could not find translations in the response")
         return results, raw_response
 
 
-def gpt_chat_create(provider_name: str, model: str, api_key: str | None, text: str) -> str | None:
+def gpt_chat_create(
+    provider_name: str,
+    model: str,
+    api_key: str | None,
+    messages: list[dict[str, str]],
+    usage: TokenUsage | None = None,
+) -> str | None:
     if provider_name.lower() == "openai":
         client = OpenAI(api_key=api_key)
         completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": text,
-                }
-            ],
+            messages=messages,  # type: ignore
             model=model,
             temperature=0.1,
         )
@@ -205,6 +299,8 @@ def gpt_chat_create(provider_name: str, model: str, api_key: str | None, text: s
             api_key=api_key,
             model=model,
             temperature=0.1,
-            messages=[{"role": "user", "content": text}],
+            messages=messages,
         )
+    if usage is not None:
+        usage.add(completion)
     return completion.choices[0].message.content
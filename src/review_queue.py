@@ -0,0 +1,57 @@
+import pathlib
+import time
+
+import diskcache as dc  # type: ignore
+
+
+class ReviewQueue:
+    """
+    Persistent, bounded queue of translations waiting for a human review.
+
+    A translation run adds items with put() and a separate review run (see `run_translation.py --review`) works
+    through them with peek() and done(). Both can use the same queue directory at the same time, but only one
+    reviewer should consume a queue.
+    """
+
+    def __init__(self, directory: pathlib.Path, maxsize: int = 200) -> None:
+        self.directory = directory
+        self.maxsize = maxsize
+        self.items = dc.Deque(directory=str(directory / "items"))
+        # URLs of the queued units, so that units waiting for review are not translated again
+        self.pending = dc.Index(str(directory / "pending"))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def is_pending(self, unit: dict) -> bool:
+        return unit["url"] in self.pending
+
+    def put_unit(self, unit: dict, project: str, gpt_reliable: bool) -> None:
+        self.pending[unit["url"]] = True
+        self._put({"kind": "unit", "project": project, "gpt_reliable": gpt_reliable, "unit": unit})
+
+    def put_glossary(self, glossary: dict[str, str]) -> None:
+        self._put({"kind": "glossary", "glossary": glossary})
+
+    def peek(self) -> dict | None:
+        """Return the oldest item without removing it, or None if the queue is empty."""
+        try:
+            return self.items.peekleft()
+        except IndexError:
+            return None
+
+    def done(self) -> None:
+        """Remove the oldest item, once it was reviewed."""
+        try:
+            item = self.items.popleft()
+        except IndexError:
+            return
+        if item["kind"] == "unit":
+            self.pending.pop(item["unit"]["url"], None)
+
+    def _put(self, item: dict) -> None:
+        if len(self.items) >= self.maxsize:
+            print(f"Review queue is full ({len(self.items)} items), waiting for the review to catch up...")
+            while len(self.items) >= self.maxsize:
+                time.sleep(5)
+        self.items.append(item)
@@ -4,10 +4,14 @@ import sys
 import time
 
 import editor  # type: ignore
+import requests
 
+from .batch_controller import AdaptiveBatchSize
 from .cacher import Cacher
 from .gpt_translator import GPTTranslator, TranslationResponse
-from .weblate_client import WeblateClient
+from .review_queue import ReviewQueue
+from .utils import prefetch
+from .weblate_client import WeblateClient, WeblateUnitClient
 
 
 class TranslationProcessor:
@@ -19,10 +23,13 @@ class TranslationProcessor:
         projects: list[str],
         target_lang: str,
         weblate_api_key: str,
-        gpt_translator: GPTTranslator,
+        gpt_translator: GPTTranslator | None,
         cacher: Cacher,
         gpt_reliable: bool,
         answer_yes: bool,
+        batch_controller: AdaptiveBatchSize | None = None,
+        prefetch_pages: int = 2,
+        review_queue: ReviewQueue | None = None,
     ) -> None:
         self.weblate_name = weblate_name
         self.username = username
@@ -31,10 +38,16 @@ class TranslationProcessor:
         self.target_lang = target_lang
         self.weblate_api_key = weblate_api_key
         self.weblate_client: WeblateClient | None = None
-        self.gpt_translator: GPTTranslator = gpt_translator
+        # Not needed to review queued translations
+        self.gpt_translator = gpt_translator
         self.cacher = cacher
         self.gpt_reliable = gpt_reliable
         self.answer_yes = answer_yes
+        self.batch_controller = batch_controller
+        self.prefetch_pages = prefetch_pages
+        self.review_queue = review_queue
+        # Commits reviewed units by their URL, without loading the project and its glossary
+        self.unit_client = WeblateUnitClient(api_url=api_url, weblate_api_key=weblate_api_key)
 
     def update_weblate_client(self, project: str) -> None:
         self.weblate_client = WeblateClient(
@@ -43,6 +56,8 @@ class TranslationProcessor:
             target_lang=self.target_lang,
             weblate_api_key=self.weblate_api_key,
         )
+        if self.batch_controller:
+            self.weblate_client.set_incomplete_page_size(self.batch_controller.batch_size)
 
     def process_incomplete_translations(self) -> None:
         for project in self.projects:
@@ -55,12 +70,14 @@ class TranslationProcessor:
                 return
             last_component = ""
             last_unit_url = ""
-            for component, trans_units, has_more in self.weblate_client.get_translation_units(
-                self.weblate_client.components, only_incomplete=True
+            # Fetch the next pages (and the lock state of the next components) while the current page is translated
+            for component, trans_units, has_more in prefetch(
+                self.weblate_client.get_translation_units(self.weblate_client.components, only_incomplete=True),
+                self.prefetch_pages,
             ):
                 print(f"Processing project: {project} and component {component}")
                 if trans_units:
-                    self._process_translation(trans_units)
+                    self._process_translation(trans_units, has_more)
                     last_component = component
                     last_unit_url = trans_units[-1]["web_url"]
                 if self.answer_yes:
@@ -109,62 +126,49 @@ class TranslationProcessor:
         print("Marking project as completed:", project)
         path.touch()
 
-    def _process_translation(self, trans_units: list[dict]) -> None:
+    def _process_translation(self, trans_units: list[dict], has_more: bool = False) -> None:
         print(f"Processing {len(trans_units)} incomplete translations...")
         to_translate: list[dict] = []
-        to_translate_total_len = 0  # Prompt length assumption
+        to_translate_total_len = 0  # Prompt length assumption, in chars
         to_commit: list[dict] = []
         if self.weblate_client is None:
             print("ERROR: self.weblate_client is not set")
             return
+        if self.gpt_translator is None:
+            print("ERROR: self.gpt_translator is not set")
+            return
+        gpt_translator = self.gpt_translator
         if self.weblate_client.glossary:
-            self.gpt_translator.set_glossary(self.weblate_client.glossary)
+            gpt_translator.set_glossary(self.weblate_client.glossary)
+        batch_size = self.batch_controller.batch_size if self.batch_controller else len(trans_units)
         for unit_to_update in trans_units:
+            if self.review_queue and self.review_queue.is_pending(unit_to_update):
+                continue
             cached_translation_target = self.cacher.cache_get_unit(unit_to_update)
             if cached_translation_target:
                 unit_to_update["target"] = cached_translation_target
                 to_commit.append(unit_to_update)
                 continue
             to_translate.append(unit_to_update)
-            to_translate_total_len += len(unit_to_update["source"])
-            if to_translate_total_len > 20000:  # batch size, in chars
-                transl_part: TranslationResponse = self.gpt_translator.translate(to_translate)
-                if transl_part.new_glossary:
-                    print("New glossary:")
-                    for k, v in transl_part.new_glossary.items():
-                        print(f"  {k} --> {v}")
-                    update_glossary = self.answer_yes or input("Update glossary [y/n]? ").lower()
-                    if update_glossary == "y":
-                        for k, v in transl_part.new_glossary.items():
-                            if self.cacher.cache_get_string(k):
-                                print(f"Glossary cache already has an entry for {k}")
-                            else:
-                                print(f"Updating glossary cache {k} --> {v}")
-                                self.cacher.cache_update_string(k, v)
-                for trans_unit in transl_part.translation_units.values():
-                    if trans_unit.get("target"):
-                        to_commit.append(trans_unit)
+            to_translate_total_len += sum(len(s) for s in unit_to_update["source"])
+            if to_translate_total_len > 20000 or len(to_translate) >= batch_size:  # batch size, in chars and units
+                to_commit.extend(self._translate_batch(gpt_translator, to_translate, full=True))
                 to_translate.clear()
                 to_translate_total_len = 0
 
         if to_translate:
-            transl_final: TranslationResponse = self.gpt_translator.translate(to_translate)
-            if transl_final.new_glossary:
-                for k, v in transl_final.new_glossary.items():
-                    print(f"  {k} --> {v}")
-                update_glossary = self.answer_yes or input("Update glossary [y/n]? ").lower()
-                if update_glossary == "y":
-                    for k, v in transl_final.new_glossary.items():
-                        if self.cacher.cache_get_string(k):
-                            print(f"Glossary cache already has an entry for {k}")
-                        else:
-                            print(f"Updating glossary cache {k} --> {v}")
-                            self.cacher.cache_update_string(k, v)
-            for trans_unit in transl_final.translation_units.values():
-                if trans_unit.get("target"):
-                    to_commit.append(trans_unit)
+            # Cached units make this batch smaller than the page, it only counts as full if more pages follow and it is
+            # at least half of the batch size
+            full = has_more and 2 * len(to_translate) >= batch_size
+            to_commit.extend(self._translate_batch(gpt_translator, to_translate, full=full))
 
         commit_count = 0
+        if to_commit and self.review_queue:
+            # Leave the review to `--review`, the units stay incomplete in Weblate until then
+            for unit in to_commit:
+                self.review_queue.put_unit(unit, self.weblate_client.project, self.gpt_reliable)
+            print(f"Queued {len(to_commit)} translations for review, {len(self.review_queue)} waiting in total")
+            to_commit.clear()
         if to_commit:
             accept_all = "y" if self.answer_yes else None
             print(">" * 80)
@@ -187,12 +191,98 @@ class TranslationProcessor:
                 )
                 commit_count += 1
             to_commit.clear()
+        print(f"Committed {commit_count} translations")
 
-        # Compensate for the skipped translations
-        self.weblate_client.set_incomplete_page_size(
-            self.weblate_client.default_incomplete_page_size
-            + (self.weblate_client.default_incomplete_page_size - commit_count)
-        )
+        if self.batch_controller:
+            self.weblate_client.set_incomplete_page_size(self.batch_controller.batch_size)
+
+    def _translate_batch(self, gpt_translator: GPTTranslator, to_translate: list[dict], full: bool) -> list[dict]:
+        """Translate one batch, handle the proposed glossary and return the translated units."""
+        try:
+            transl_part: TranslationResponse = gpt_translator.translate(to_translate)
+        except Exception:
+            if self.batch_controller:
+                self.batch_controller.record_failure()
+            raise
+        translated = [unit for unit in transl_part.translation_units.values() if unit.get("target")]
+        if self.batch_controller:
+            self.batch_controller.record(
+                len(to_translate), len(translated), transl_part.latency, transl_part.attempts, full
+            )
+        if transl_part.new_glossary:
+            if self.review_queue:
+                self.review_queue.put_glossary(transl_part.new_glossary)
+            else:
+                self._review_glossary(transl_part.new_glossary)
+        return translated
+
+    def _review_glossary(self, new_glossary: dict[str, str]) -> None:
+        print("New glossary:")
+        for k, v in new_glossary.items():
+            print(f"  {k} --> {v}")
+        update_glossary = self.answer_yes or input("Update glossary [y/n]? ").lower()
+        if update_glossary == "y":
+            for k, v in new_glossary.items():
+                if self.cacher.cache_get_string(k):
+                    print(f"Glossary cache already has an entry for {k}")
+                else:
+                    print(f"Updating glossary cache {k} --> {v}")
+                    self.cacher.cache_update_string(k, v)
+
+    def review_queued_translations(self) -> int:
+        """
+        Review the translations queued by another run and commit the approved ones.
+
+        Only the items that were queued when this is called are reviewed, so that an "all" or "skip" answer does not
+        apply to translations queued later. Returns the number of reviewed items, 0 if the queue was empty.
+        """
+        if self.review_queue is None:
+            print("ERROR: self.review_queue is not set")
+            return 0
+        accept_all = None
+        reviewed = 0
+        for _ in range(len(self.review_queue)):
+            item = self.review_queue.peek()
+            if item is None:
+                break
+            if item["kind"] == "glossary":
+                self._review_glossary(item["glossary"])
+            else:
+                unit = item["unit"]
+                try:
+                    current_unit = self.unit_client.get_translation_unit(unit["url"])
+                    if _changed_since_queued(unit, current_unit):
+                        print("Unit removed or changed in Weblate since it was queued, skipping:", unit["web_url"])
+                    else:
+                        print(f"Reviewing project: {item['project']}, {len(self.review_queue)} translations waiting")
+                        accept_all, unit_to_update = _ask_proceed(unit, accept_all)
+                        if unit_to_update:
+                            self.unit_client.update_translation_unit(
+                                unit_to_update, gpt_reliable=item["gpt_reliable"], auto_approved=False
+                            )
+                            if item["gpt_reliable"]:
+                                self.cacher.cache_update_unit(unit_to_update)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # Keep the unit at the head of the queue and try again in the next pass
+                    print("Failed to review unit, leaving it in the queue:", unit["web_url"])
+                    print(e)
+                    break
+            self.review_queue.done()
+            reviewed += 1
+        return reviewed
+
+
+def _changed_since_queued(queued_unit: dict, current_unit: dict | None) -> bool:
+    """Check if a unit was removed, translated or edited in Weblate after it was fetched for translation."""
+    if current_unit is None:
+        return True
+    if current_unit.get("state", 0) >= 20:
+        return True
+    return any(
+        current_unit.get(field) != queued_unit.get(field)
+        for field in ("state", "source", "last_updated", "timestamp")
+        if field in queued_unit
+    )
 
 
 def _print_one(unit: dict) -> None:
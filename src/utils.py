@@ -1,8 +1,67 @@
+import queue
+import threading
 import typing
+from collections.abc import Generator, Iterable
 
 import yaml
 
+T = typing.TypeVar("T")
+
+_DONE = object()
+
+
+class _Failure(typing.NamedTuple):
+    error: Exception
+
 
 def load_config(config_path: str) -> typing.Any:  # noqa: ANN401
     with open(config_path, encoding="utf-8") as config_file:
         return yaml.safe_load(config_file)
+
+
+def prefetch(iterable: Iterable[T], depth: int) -> Generator[T, None, None]:
+    """
+    Iterate over `iterable` in a background thread, keeping up to `depth` items ready ahead of the consumer.
+
+    Exceptions raised while producing items are re-raised in the consumer. With depth < 1 the iterable is consumed
+    directly, without a thread.
+    """
+    if depth < 1:
+        yield from iterable
+        return
+
+    items: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item: object) -> bool:
+        # Give up if the consumer went away, so that the thread does not block forever on a full queue
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
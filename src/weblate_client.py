@@ -4,38 +4,21 @@ from urllib.parse import urljoin
 import requests
 
 
-class WeblateClient:
-    def __init__(self, api_url: str, project: str, target_lang: str, weblate_api_key: str) -> None:
-        """Initialize the Weblate client
+class WeblateUnitClient:
+    def __init__(self, api_url: str, weblate_api_key: str) -> None:
+        """Initialize a client for single translation units, without loading any project
 
         Args:
             api_url (str): The Weblate API URL
-            project (str): The project name
-            target_lang (str): The target language
             weblate_api_key (str): The Weblate API key
         """
         self.api_url: str = api_url
-        if "/" not in project:
-            project += "/"
-        self.project, component_str = project.split("/", 1)
-        components = {component_str} if component_str else set()
-        print("Parsed project and components:", self.project, components)
-        self.target_lang = target_lang
         self.headers = {
             "Authorization": f"Token {weblate_api_key}",
             "Content-Type": "application/json",
         }
-        self.glossary_components = sorted(self.get_project_components(filter_glossary=True))
-        non_glossary_components = sorted(
-            components or set(self.get_project_components()) - set(self.glossary_components)
-        )
-        self.default_incomplete_page_size = 50
-        self._incomplete_page_size = self.default_incomplete_page_size
-        # First translate the glossary
-        self.components = self.glossary_components + non_glossary_components
-        print(f"Translating project {project} and components {self.components}")
-        self.glossary: dict[str, str] = {}
-        self.rebuild_glossary()
+        # Ids of the units sent to Weblate, in order, to follow how the pages of incomplete units shift
+        self.committed_unit_ids: list[int] = []
 
     def _make_request(self, endpoint: str, req_type: str = "get", **kwargs: dict) -> dict:
         url = urljoin(self.api_url, endpoint)
@@ -53,6 +36,64 @@ class WeblateClient:
         # response.raise_for_status()
         return response.json()
 
+    def get_translation_unit(self, url: str) -> dict | None:
+        """Return the current state of a unit, or None if the unit no longer exists. Other errors are raised."""
+        response = requests.get(urljoin(self.api_url, url), headers=self.headers)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def update_translation_unit(self, translated_unit: dict, gpt_reliable: bool, auto_approved: bool) -> None:
+        url = translated_unit["url"]
+        # https://docs.weblate.org/en/latest/api.html#put--api-units-(int-id)-
+        # state (int) – unit state:
+        #   0 - untranslated
+        #   10 - needs editing
+        #   20 - translated
+        #   30 - approved (need review workflow enabled, see Dedicated reviewers)
+        # target (array) – target string
+        data = {
+            "state": 20 if gpt_reliable or not auto_approved else 10,
+            "target": translated_unit["target"],
+        }
+        self.committed_unit_ids.append(translated_unit["id"])
+        try:
+            self._make_request(url, req_type="patch", json=data)
+        except requests.exceptions.HTTPError as e:
+            print("Failed to update translation unit: ", url)
+            print(e)
+
+
+class WeblateClient(WeblateUnitClient):
+    def __init__(self, api_url: str, project: str, target_lang: str, weblate_api_key: str) -> None:
+        """Initialize the Weblate client
+
+        Args:
+            api_url (str): The Weblate API URL
+            project (str): The project name
+            target_lang (str): The target language
+            weblate_api_key (str): The Weblate API key
+        """
+        super().__init__(api_url=api_url, weblate_api_key=weblate_api_key)
+        if "/" not in project:
+            project += "/"
+        self.project, component_str = project.split("/", 1)
+        components = {component_str} if component_str else set()
+        print("Parsed project and components:", self.project, components)
+        self.target_lang = target_lang
+        self.glossary_components = sorted(self.get_project_components(filter_glossary=True))
+        non_glossary_components = sorted(
+            components or set(self.get_project_components()) - set(self.glossary_components)
+        )
+        self.default_incomplete_page_size = 50
+        self._incomplete_page_size = self.default_incomplete_page_size
+        # First translate the glossary
+        self.components = self.glossary_components + non_glossary_components
+        print(f"Translating project {project} and components {self.components}")
+        self.glossary: dict[str, str] = {}
+        self.rebuild_glossary()
+
     def rebuild_glossary(self) -> None:
         print("Rebuilding glossary...")
         self.glossary = {}
@@ -82,7 +123,9 @@ class WeblateClient:
         return response.get("locked", False)
 
     def set_incomplete_page_size(self, size: int) -> None:
-        print(f"Setting incomplete page size to {size}")
+        """Set the page size of the incomplete units, it is read before every page lookup."""
+        if size != self._incomplete_page_size:
+            print(f"Setting incomplete page size to {size}")
         self._incomplete_page_size = size
 
     @property
@@ -96,24 +139,19 @@ class WeblateClient:
             if self.is_component_locked(component):
                 print(f"Component {component} is locked, skipping")
                 continue
-            self._incomplete_page_size = self.default_incomplete_page_size
+            endpoint = f"translations/{self.project}/{component}/{self.target_lang}/units/"
+            if only_incomplete:
+                for results, has_more in self._get_incomplete_units(endpoint):
+                    yield (component, results, has_more)
+                continue
             has_more = True
             page = 0
             while has_more:
-                endpoint = f"translations/{self.project}/{component}/{self.target_lang}/units/"
-
                 # Determine query parameters
                 if only_translated:
                     params = {"q": "state:>=translated", "page_size": 1000}
                     if page > 0:
                         params["page"] = page
-                elif only_incomplete:
-                    params = {
-                        "q": "state:<translated AND (changed:<yesterday OR state:empty)",
-                        "page_size": self._incomplete_page_size,
-                    }
-                    if page > 0:
-                        params["page"] = page
                 else:
                     params = {"page_size": 200}
                     if page > 0:
@@ -132,21 +170,47 @@ class WeblateClient:
                 if results:
                     yield (component, results, has_more)
 
-    def update_translation_unit(self, translated_unit: dict, gpt_reliable: bool, auto_approved: bool) -> None:
-        url = translated_unit["url"]
-        # https://docs.weblate.org/en/latest/api.html#put--api-units-(int-id)-
-        # state (int) – unit state:
-        #   0 - untranslated
-        #   10 - needs editing
-        #   20 - translated
-        #   30 - approved (need review workflow enabled, see Dedicated reviewers)
-        # target (array) – target string
-        data = {
-            "state": 20 if gpt_reliable or not auto_approved else 10,
-            "target": translated_unit["target"],
-        }
-        try:
-            self._make_request(url, req_type="patch", json=data)
-        except requests.exceptions.HTTPError as e:
-            print("Failed to update translation unit: ", url)
-            print(e)
+    def _get_incomplete_units(self, endpoint: str) -> Generator[tuple[list[dict], bool], None, None]:
+        """
+        Yield the incomplete units of a component, every unit only once.
+
+        Committed units drop out of the query while the pages are read (the pages may be prefetched while the
+        previous ones are committed), so page numbers do not point at stable units. A page is read again if some of
+        its units were committed, otherwise the next page is read, and units that were already returned are skipped.
+        If units of earlier pages were committed while later pages were read, units may have moved to pages that
+        were already read, so the component is read again from the first page.
+        """
+        seen: set[int] = set()
+        offset = 0
+        committed = len(self.committed_unit_ids)
+        shifted = False
+        while True:
+            page_size = self._incomplete_page_size
+            page = offset // page_size + 1
+            while True:
+                params = {
+                    "q": "state:<translated AND (changed:<yesterday OR state:empty)",
+                    "page_size": page_size,
+                    "page": page,
+                }
+                res = self._make_request(endpoint, req_type="get", params=params)
+                has_more = bool(res.get("next"))
+                results = [unit for unit in res.get("results", []) if unit["id"] not in seen]
+                if results:
+                    break
+                if has_more:
+                    page += 1
+                    continue
+                if not shifted and len(self.committed_unit_ids) == committed:
+                    return
+                print("Units were committed while reading the pages, reading the component again")
+                page, committed, shifted = 1, len(self.committed_unit_ids), False
+            seen.update(unit["id"] for unit in results)
+            yield (results, has_more)
+            page_ids = {unit["id"] for unit in results}
+            committed_now = len(self.committed_unit_ids)
+            new_commits = set(self.committed_unit_ids[committed:committed_now])
+            committed = committed_now
+            shifted = shifted or bool(new_commits - page_ids)
+            # Read the same page again only if its units dropped out of the query
+            offset = (page - 1 if new_commits & page_ids else page) * page_size